@@ -6,6 +6,7 @@ import tempfile
 from pathlib import Path
 import numpy as np
 import librosa
+import soundfile as sf
 from IPython.display import Audio, display, HTML
 
 # Define default soundfont path
@@ -124,7 +125,8 @@ def compute_mel_spectrogram(
     hop_length=512,
     n_mels=229,
     fmin=20.0,
-    fmax=8000.0
+    fmax=8000.0,
+    normalizer=None
 ):
     """
     Computes a log-mel spectrogram from audio data.
@@ -137,6 +139,8 @@ def compute_mel_spectrogram(
         n_mels: Number of mel bands
         fmin: Lowest frequency (Hz)
         fmax: Highest frequency (Hz)
+        normalizer: Optional FeatureNormalizer (see utils.normalization) applied
+                    to the log-mel output, e.g. at inference time
 
     Returns:
         Log-mel spectrogram as a numpy array
@@ -155,4 +159,89 @@ def compute_mel_spectrogram(
     # Convert to log scale (dB)
     log_mel_spec = librosa.power_to_db(mel_spec, ref=np.max)
 
+    # Per-mel-bin standardization with the dataset statistics
+    if normalizer is not None:
+        log_mel_spec = normalizer(log_mel_spec)
+
     return log_mel_spec
+
+
+def compute_mel_spectrogram_chunked(
+    audio_path,
+    target_sr,
+    chunk_seconds=30.0,
+    n_fft=2048,
+    hop_length=512,
+    n_mels=229,
+    fmin=20.0,
+    fmax=8000.0,
+    normalizer=None
+):
+    """
+    Memory-bounded equivalent of preprocess_audio followed by compute_mel_spectrogram.
+
+    The file is decoded chunk by chunk, so only about chunk_seconds of audio is
+    held in memory at once. Each chunk is read with a margin of a few frames on
+    both sides so the STFT windows (and the resampler) see the same samples as
+    in a whole-file pass, and only the frames of the chunk itself are kept.
+    Peak normalization and the dB reference need the whole file, so they are
+    applied to the accumulated mel power at the end (peak normalization is a
+    scale on the power, which is exact).
+
+    Args:
+        audio_path: Path to the input audio file
+        target_sr: The target sample rate to resample to
+        chunk_seconds: Length of audio decoded at once, in seconds
+        n_fft: FFT window size
+        hop_length: Hop length between frames
+        n_mels: Number of mel bands
+        fmin: Lowest frequency (Hz)
+        fmax: Highest frequency (Hz)
+        normalizer: Optional FeatureNormalizer applied to the log-mel output
+
+    Returns:
+        Log-mel spectrogram as a numpy array, or None if loading fails
+    """
+    try:
+        info = sf.info(str(audio_path))
+        n_samples = int(np.ceil(info.frames * target_sr / info.samplerate))
+        n_frames = 1 + n_samples // hop_length
+        frames_per_chunk = max(1, int(chunk_seconds * target_sr / hop_length))
+        # Enough context for half an FFT window plus resampling edge effects
+        margin = (n_fft // hop_length + 4) * hop_length
+
+        mel_power = np.zeros((n_mels, n_frames), dtype=np.float32)
+        peak = 0.0
+        for f0 in range(0, n_frames, frames_per_chunk):
+            f1 = min(f0 + frames_per_chunk, n_frames)
+            start = max(0, f0 * hop_length - margin)
+            end = f1 * hop_length + margin
+            y, _ = librosa.load(audio_path, sr=target_sr, mono=True,
+                                offset=start / target_sr,
+                                duration=(end - start) / target_sr)
+            if len(y) == 0:
+                break
+
+            # Peak over the samples that belong to this chunk only
+            core = y[f0 * hop_length - start:f1 * hop_length - start]
+            if len(core):
+                peak = max(peak, float(np.max(np.abs(core))))
+
+            chunk_mel = librosa.feature.melspectrogram(
+                y=y, sr=target_sr, n_fft=n_fft, hop_length=hop_length,
+                n_mels=n_mels, fmin=fmin, fmax=fmax)
+            j0 = (f0 * hop_length - start) // hop_length
+            chunk_mel = chunk_mel[:, j0:j0 + (f1 - f0)]
+            mel_power[:, f0:f0 + chunk_mel.shape[1]] = chunk_mel
+
+        # Same peak normalization as preprocess_audio, applied to the power
+        if peak > 0:
+            mel_power *= 1.0 / (peak + 1e-8) ** 2
+
+        log_mel_spec = librosa.power_to_db(mel_power, ref=np.max)
+        if normalizer is not None:
+            log_mel_spec = normalizer(log_mel_spec)
+        return log_mel_spec
+    except Exception as e:
+        print(f"Error processing {audio_path}: {e}")
+        return None
@@ -0,0 +1,225 @@
+"""
+Benchmarks for the slow paths of the transcription pipeline.
+"""
+import time
+import numpy as np
+import torch
+import pretty_midi
+import matplotlib.pyplot as plt
+
+from utils.drum_mapping import MAIN_DRUMS, MAIN_DRUM_NAMES
+from utils.visualization import plot_drum_piano_roll
+from utils.prediction import _plot_comparison
+from utils.decimation import decimated_inference
+
+
+def _timed(fn, repeats=3):
+    """Returns the best wall time in seconds of fn() over several repeats."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _synthetic_transcription(duration, sr, hop_length, n_mels, hits_per_second, seed):
+    """Random drum MIDI and model outputs covering `duration` seconds."""
+    rng = np.random.default_rng(seed)
+    n_frames = int(duration * sr / hop_length)
+    n_drums = len(MAIN_DRUMS)
+
+    pm = pretty_midi.PrettyMIDI()
+    instrument = pretty_midi.Instrument(program=0, is_drum=True)
+    n_notes = int(duration * hits_per_second)
+    starts = np.sort(rng.uniform(0, duration, n_notes))
+    pitches = rng.choice(MAIN_DRUMS, n_notes)
+    for start, pitch in zip(starts, pitches):
+        instrument.notes.append(pretty_midi.Note(
+            velocity=100, pitch=int(pitch), start=start, end=start + 0.1))
+    pm.instruments.append(instrument)
+
+    spec = torch.from_numpy(rng.standard_normal(
+        (n_mels, n_frames)).astype(np.float32))
+    onsets = torch.from_numpy(
+        (rng.random((n_drums, n_frames)) < 0.02).astype(np.float32))
+    velocities = torch.from_numpy(
+        rng.random((n_drums, n_frames)).astype(np.float32))
+    return pm, spec, onsets, velocities
+
+
+def benchmark_rendering(duration=600.0, sr=22050, hop_length=512, n_mels=229,
+                        hits_per_second=8, max_frames=2000, repeats=3, seed=0):
+    """
+    Times piano-roll and comparison plot rendering on a long synthetic input.
+
+    Full-resolution rendering (max_frames=None) is timed next to the pooled
+    path so the speedup is visible. Figures are drawn off-screen.
+
+    Args:
+        duration: Length of the synthetic transcription in seconds (10 minutes by default)
+        sr: Sample rate
+        hop_length: Hop length between frames
+        n_mels: Number of mel bands
+        hits_per_second: Average number of drum notes per second
+        max_frames: Display resolution for the pooled path
+        repeats: Number of timed repeats (the best one is reported)
+        seed: Random seed
+
+    Returns:
+        Dictionary mapping benchmark names to wall times in seconds
+    """
+    backend = plt.get_backend()
+    plt.switch_backend('Agg')
+    pm, spec, onsets, velocities = _synthetic_transcription(
+        duration, sr, hop_length, n_mels, hits_per_second, seed)
+
+    def render(plot_fn):
+        def run():
+            plt.figure(figsize=(15, 4))
+            plot_fn()
+            plt.gcf().canvas.draw()
+            plt.close('all')
+        return run
+
+    def comparison(frames, **kwargs):
+        return lambda: _plot_comparison(
+            spec, onsets, velocities, onsets, velocities, 0.5, "benchmark",
+            MAIN_DRUM_NAMES, hop_length, max_frames=frames, **kwargs)
+
+    results = {}
+    try:
+        results['piano_roll'] = _timed(
+            render(lambda: plot_drum_piano_roll(pm, max_columns=max_frames)), repeats)
+        results['piano_roll_window_30s'] = _timed(render(lambda: plot_drum_piano_roll(
+            pm, start_time=60.0, end_time=90.0, max_columns=max_frames)), repeats)
+        results['comparison_full_resolution'] = _timed(
+            render(comparison(None)), repeats)
+        results['comparison_pooled'] = _timed(
+            render(comparison(max_frames)), repeats)
+        window = int(30.0 * sr / hop_length)
+        results['comparison_window_30s'] = _timed(render(comparison(
+            max_frames, start_frame=window, end_frame=2 * window)), repeats)
+    finally:
+        plt.switch_backend(backend)
+
+    print(f"Rendering benchmark ({duration / 60:.1f} min, "
+          f"{spec.shape[1]} frames, {len(pm.instruments[0].notes)} notes):")
+    for name, seconds in results.items():
+        print(f"  {name}: {seconds * 1000:.1f} ms")
+    return results
+
+
+def _onset_counts(pred_onsets, gt_onsets, tolerance):
+    """
+    Counts true positives, predicted and reference onsets for one clip.
+
+    A predicted onset matches a reference onset of the same drum if it lies
+    within `tolerance` frames; each reference onset is matched at most once.
+    """
+    tp = n_pred = n_ref = 0
+    for pred_row, gt_row in zip(pred_onsets, gt_onsets):
+        pred_frames = np.flatnonzero(pred_row)
+        ref_frames = np.flatnonzero(gt_row)
+        n_pred += len(pred_frames)
+        n_ref += len(ref_frames)
+        used = np.zeros(len(ref_frames), dtype=bool)
+        for frame in pred_frames:
+            candidates = np.flatnonzero(
+                (np.abs(ref_frames - frame) <= tolerance) & ~used)
+            if len(candidates):
+                used[candidates[0]] = True
+                tp += 1
+    return tp, n_pred, n_ref
+
+
+def _f1(tp, n_pred, n_ref):
+    """F1 score from match counts."""
+    precision = tp / n_pred if n_pred else 0.0
+    recall = tp / n_ref if n_ref else 0.0
+    return 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+
+def benchmark_decimation(model, data_loader, device, threshold=0.5, tolerance=1,
+                         max_samples=None, **decimation_kwargs):
+    """
+    Compares dense and onset-decimated inference on a split (e.g. the test split).
+
+    Each clip is run once densely and once through decimated_inference, both
+    with batch size 1 so the timings are comparable.
+
+    Args:
+        model: Trained model
+        data_loader: DataLoader of the split to evaluate
+        device: Device to run inference on
+        threshold: Threshold for onset detection
+        tolerance: Onset matching tolerance in frames for the F1 score
+        max_samples: Optional maximum number of clips
+        **decimation_kwargs: Passed to decimated_inference
+
+    Returns:
+        Dictionary with frames skipped, timings, speedup and dense/decimated F1
+    """
+    model.eval()
+    totals = {"frames": 0, "frames_skipped": 0,
+              "dense_time": 0.0, "decimated_time": 0.0}
+    dense_counts = np.zeros(3, dtype=np.int64)
+    decimated_counts = np.zeros(3, dtype=np.int64)
+    samples_seen = 0
+
+    def sync():
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    with torch.no_grad():
+        for batch in data_loader:
+            for i in range(batch["input"].size(0)):
+                if max_samples is not None and samples_seen >= max_samples:
+                    break
+                spec = batch["input"][i]
+                gt_onsets = batch["onset_target"][i].numpy() > 0.5
+
+                sync()
+                start = time.perf_counter()
+                onset_logits, _ = model(spec.unsqueeze(0).to(device))
+                dense_probs = torch.sigmoid(onset_logits[0]).cpu()
+                sync()
+                totals["dense_time"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                decimated_probs, _, stats = decimated_inference(
+                    model, spec, device, **decimation_kwargs)
+                sync()
+                totals["decimated_time"] += time.perf_counter() - start
+
+                totals["frames"] += stats["frames"]
+                totals["frames_skipped"] += stats["frames_skipped"]
+                dense_counts += _onset_counts(
+                    dense_probs.numpy() > threshold, gt_onsets, tolerance)
+                decimated_counts += _onset_counts(
+                    decimated_probs.numpy() > threshold, gt_onsets, tolerance)
+                samples_seen += 1
+            if max_samples is not None and samples_seen >= max_samples:
+                break
+
+    results = {
+        "clips": samples_seen,
+        "frames": totals["frames"],
+        "frames_skipped": totals["frames_skipped"],
+        "skipped_ratio": totals["frames_skipped"] / max(totals["frames"], 1),
+        "dense_time": totals["dense_time"],
+        "decimated_time": totals["decimated_time"],
+        "speedup": totals["dense_time"] / max(totals["decimated_time"], 1e-9),
+        "dense_f1": _f1(*dense_counts),
+        "decimated_f1": _f1(*decimated_counts),
+    }
+    results["f1_cost"] = results["dense_f1"] - results["decimated_f1"]
+
+    print(f"Decimation benchmark ({results['clips']} clips, {results['frames']} frames):")
+    print(f"  Frames skipped: {results['frames_skipped']} "
+          f"({results['skipped_ratio'] * 100:.1f}%)")
+    print(f"  Dense: {results['dense_time']:.2f}s, decimated: {results['decimated_time']:.2f}s "
+          f"(speedup x{results['speedup']:.2f})")
+    print(f"  F1 dense: {results['dense_f1']:.4f}, decimated: {results['decimated_f1']:.4f} "
+          f"(cost {results['f1_cost']:.4f})")
+    return results
@@ -0,0 +1,226 @@
+"""
+Memory estimation and memory-bounded scheduling for batch processing.
+"""
+import os
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Optional
+
+import soundfile as sf
+
+# Multiplier on the estimates to cover allocator overhead and temporaries
+MEMORY_SAFETY_FACTOR = 1.5
+
+
+def clip_duration(audio_path: Path, duration: Optional[float] = None) -> float:
+    """
+    Returns the clip duration in seconds, read from the file header if not given.
+
+    Args:
+        audio_path: Path to the audio file
+        duration: Known duration (e.g. the metadata 'duration' column), used if valid
+
+    Returns:
+        Duration in seconds
+    """
+    if duration is not None and duration == duration and duration > 0:  # skips NaN
+        return float(duration)
+    return sf.info(str(audio_path)).duration
+
+
+def estimate_clip_memory(
+    duration: float,
+    target_sr: int,
+    hop_length: int = 512,
+    n_mels: int = 229,
+    n_fft: int = 2048,
+    native_sr: int = 44100,
+    channels: int = 2
+) -> int:
+    """
+    Estimates the peak memory in bytes of extracting features from one clip.
+
+    Covers the float32 decode at the native rate, the mono mix and resampled
+    copies, the complex STFT and its power, and the mel, dB and target arrays.
+
+    Args:
+        duration: Clip duration in seconds
+        target_sr: Target sample rate
+        hop_length: Hop length between frames
+        n_mels: Number of mel bands
+        n_fft: FFT window size
+        native_sr: Sample rate of the source files
+        channels: Number of channels of the source files
+
+    Returns:
+        Estimated peak memory in bytes
+    """
+    n_frames = duration * target_sr / hop_length + 1
+    n_bins = n_fft // 2 + 1
+    decoded = duration * native_sr * 4 * (channels + 1)
+    resampled = duration * target_sr * 4 * 2
+    stft = n_bins * n_frames * (8 + 4)
+    mel = n_mels * n_frames * 4 * 3
+    return int((decoded + resampled + stft + mel) * MEMORY_SAFETY_FACTOR)
+
+
+def chunk_seconds_for_budget(
+    duration: float,
+    memory_budget: int,
+    target_sr: int,
+    hop_length: int = 512,
+    n_mels: int = 229,
+    n_fft: int = 2048,
+    native_sr: int = 44100,
+    channels: int = 2
+) -> float:
+    """
+    Picks a chunk length whose chunked extraction fits in the memory budget.
+
+    The whole-clip mel power and dB arrays are always kept, the rest scales
+    with the chunk length. Half of what remains is given to a chunk.
+
+    Returns:
+        Chunk length in seconds (at least one second)
+    """
+    n_frames = duration * target_sr / hop_length + 1
+    resident = int(n_mels * n_frames * 4 * 3 * MEMORY_SAFETY_FACTOR)
+    per_second = estimate_clip_memory(
+        1.0, target_sr, hop_length, n_mels, n_fft, native_sr, channels)
+    return max(1.0, (memory_budget - resident) / 2 / per_second)
+
+
+def chunked_clip_memory(
+    duration: float,
+    chunk_seconds: float,
+    target_sr: int,
+    hop_length: int = 512,
+    n_mels: int = 229,
+    n_fft: int = 2048,
+    native_sr: int = 44100,
+    channels: int = 2
+) -> int:
+    """Estimates the peak memory in bytes of chunked feature extraction."""
+    n_frames = duration * target_sr / hop_length + 1
+    resident = int(n_mels * n_frames * 4 * 3 * MEMORY_SAFETY_FACTOR)
+    return resident + estimate_clip_memory(
+        chunk_seconds, target_sr, hop_length, n_mels, n_fft, native_sr, channels)
+
+
+def _current_rss() -> Optional[int]:
+    """Current resident set size of this process in bytes (Linux only)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _reset_peak_rss() -> bool:
+    """Resets this process's VmHWM to its current RSS (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> Optional[int]:
+    """Peak resident set size (VmHWM) of this process in bytes (Linux only)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def call_with_task_memory(fn, task):
+    """
+    Worker wrapper: returns (fn(task), memory added by the task in bytes).
+
+    The measurement is the task's peak RSS minus the RSS before it started,
+    so pages a forked worker shares with its parent (e.g. a notebook holding
+    the model and data) are not counted. The peak is reset before each task,
+    so one large clip does not affect later measurements. Returns None for
+    the memory where /proc is not available.
+    """
+    before = _current_rss()
+    peak_was_reset = _reset_peak_rss()
+    result = fn(task)
+    after = _peak_rss() if peak_was_reset else _current_rss()
+    if before is None or after is None:
+        return result, None
+    return result, max(0, after - before)
+
+
+def run_with_memory_budget(pool, fn, tasks, estimates, memory_budget=None, max_workers=1,
+                           calibration_window=16):
+    """
+    Runs fn over tasks in a process pool while keeping memory under a budget.
+
+    A task is only submitted while the estimated memory of all running tasks
+    plus its own stays under the budget (a task is always allowed to run on
+    its own, so oversized tasks cannot stall the queue; give them a chunked
+    path and a matching estimate instead). The memory each task actually
+    adds is measured in the worker, and the estimates are scaled by the
+    largest observed/estimated ratio over the last calibration_window tasks,
+    so concurrency goes down when clips are heavier than estimated and back
+    up once they are not.
+
+    Args:
+        pool: A concurrent.futures executor
+        fn: Picklable function run on each task
+        tasks: List of task arguments
+        estimates: Estimated memory in bytes of each task. None means unknown
+                   (assumed as large as the largest recent task), 0 means
+                   negligible (e.g. a skipped file); neither is used for calibration
+        memory_budget: Memory budget in bytes (None for no limit)
+        max_workers: Maximum number of concurrent tasks
+        calibration_window: Number of recent tasks used to calibrate the estimates
+
+    Yields:
+        fn results in completion order
+    """
+    if memory_budget is None:
+        memory_budget = float("inf")
+    pending = deque(range(len(tasks)))
+    in_flight = {}
+    in_use = 0
+    ratios = deque(maxlen=calibration_window)
+    measured = deque(maxlen=calibration_window)
+
+    def scaled_estimate(i):
+        if estimates[i] is None:
+            # Unknown size: assume it is as large as the largest recent task
+            return max(measured, default=0)
+        # Never trust the estimates to be more than 2x too large
+        return estimates[i] * max(max(ratios, default=1.0), 0.5)
+
+    while pending or in_flight:
+        while pending and len(in_flight) < max_workers:
+            estimate = scaled_estimate(pending[0])
+            if in_flight and in_use + estimate > memory_budget:
+                break
+            i = pending.popleft()
+            future = pool.submit(call_with_task_memory, fn, tasks[i])
+            in_flight[future] = (i, estimate)
+            in_use += estimate
+
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            i, estimate = in_flight.pop(future)
+            in_use -= estimate
+            result, task_memory = future.result()
+            # Negligible tasks would drag the ratios towards 0 and make
+            # the next real tasks look cheaper than they are
+            if task_memory is not None and estimates[i] != 0:
+                measured.append(task_memory)
+                if estimates[i] is not None:
+                    ratios.append(task_memory / estimates[i])
+            yield result
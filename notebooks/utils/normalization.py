@@ -0,0 +1,133 @@
+"""
+Streaming per-mel-bin feature statistics and normalization.
+"""
+import numpy as np
+import torch
+from pathlib import Path
+
+# Default location of the statistics, stored next to the processed features
+FEATURE_STATS_FILENAME = "feature_stats.npz"
+
+
+class RunningMelStats:
+    """
+    Per-mel-bin mean and variance accumulated in a single streaming pass.
+
+    Each clip is folded in with the parallel (Chan et al.) form of Welford's
+    algorithm, so statistics computed in separate worker processes can be
+    merged exactly without revisiting any data.
+    """
+
+    def __init__(self, n_mels):
+        self.count = 0
+        self.mean = np.zeros(n_mels, dtype=np.float64)
+        self.m2 = np.zeros(n_mels, dtype=np.float64)
+
+    def _merge(self, count, mean, m2):
+        """Merges the (count, mean, m2) summary of another set of frames."""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    def update(self, spec):
+        """
+        Adds all frames of a spectrogram.
+
+        Args:
+            spec: Log-mel spectrogram [n_mels, n_frames]
+        """
+        spec = np.asarray(spec, dtype=np.float64)
+        mean = spec.mean(axis=1)
+        m2 = ((spec - mean[:, None]) ** 2).sum(axis=1)
+        self._merge(spec.shape[1], mean, m2)
+        return self
+
+    def merge(self, other):
+        """Merges another RunningMelStats (e.g. from a worker process) into this one."""
+        self._merge(other.count, other.mean, other.m2)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count > 0 else np.zeros_like(self.m2)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def save(self, path):
+        """Saves the statistics to an NPZ file."""
+        np.savez(path, count=self.count, mean=self.mean, m2=self.m2,
+                 std=self.std)
+        print(f"Saved feature statistics over {self.count} frames to {path}")
+
+    @classmethod
+    def from_arrays(cls, count, mean, m2):
+        """Creates statistics from a saved (count, mean, m2) summary."""
+        stats = cls(len(mean))
+        stats.count = int(count)
+        stats.mean = np.asarray(mean, dtype=np.float64)
+        stats.m2 = np.asarray(m2, dtype=np.float64)
+        return stats
+
+    @classmethod
+    def load(cls, path):
+        """Loads statistics saved by save()."""
+        with np.load(path) as data:
+            return cls.from_arrays(data["count"], data["mean"], data["m2"])
+
+    def normalizer(self, eps=1e-5):
+        """Returns a FeatureNormalizer for these statistics."""
+        if self.count == 0:
+            raise ValueError(
+                "Cannot normalize with empty feature statistics (no frames were accumulated).")
+        return FeatureNormalizer(self.mean, self.std, eps)
+
+
+class FeatureNormalizer:
+    """
+    Standardizes log-mel spectrograms per mel bin.
+
+    The mean and standard deviation are folded into a single scale and shift
+    so normalization is one multiply-add over the features. Works on NumPy
+    arrays and torch tensors shaped [n_mels, n_frames] or [B, n_mels, n_frames],
+    so the same object can be used as a dataset transform and in inference.
+    """
+
+    def __init__(self, mean, std, eps=1e-5):
+        self.scale = (1.0 / (np.asarray(std) + eps)).astype(np.float32)
+        self.shift = (-np.asarray(mean) * self.scale).astype(np.float32)
+        self._torch_params = {}
+
+    @classmethod
+    def load(cls, path, eps=1e-5):
+        """Creates a normalizer from statistics saved by RunningMelStats.save()."""
+        return RunningMelStats.load(path).normalizer(eps)
+
+    @classmethod
+    def from_dataset_dir(cls, processed_dir, eps=1e-5):
+        """Loads the statistics stored next to a processed dataset."""
+        return cls.load(Path(processed_dir) / FEATURE_STATS_FILENAME, eps)
+
+    def _params_for(self, tensor):
+        """Scale and shift as tensors on the tensor's device (cached)."""
+        key = (tensor.device, tensor.dtype)
+        if key not in self._torch_params:
+            self._torch_params[key] = (
+                torch.from_numpy(self.scale[:, None]).to(
+                    device=tensor.device, dtype=tensor.dtype),
+                torch.from_numpy(self.shift[:, None]).to(
+                    device=tensor.device, dtype=tensor.dtype))
+        return self._torch_params[key]
+
+    def __call__(self, spec):
+        if isinstance(spec, torch.Tensor):
+            scale, shift = self._params_for(spec)
+            return torch.addcmul(shift, spec, scale)
+        out = np.multiply(spec, self.scale[:, None], dtype=np.float32)
+        out += self.shift[:, None]
+        return out
@@ -12,6 +12,7 @@ import soundfile as sf
 from IPython.display import Audio, display, HTML
 
 from utils.audio import midi_to_audio
+from utils.visualization import max_pool_frames, MAX_DISPLAY_FRAMES
 
 
 def predictions_to_midi(onset_frames, velocity_frames, threshold, frame_times, index_to_pitch_map, fixed_note_duration=0.1):
@@ -60,6 +61,37 @@ def predictions_to_midi(onset_frames, velocity_frames, threshold, frame_times, i
     return pm
 
 
+def raw_file_stem(processed_stem):
+    """Remove the drummer prefix from a processed file stem to match raw filenames."""
+    first_underscore_index = processed_stem.find('_')
+    if first_underscore_index == -1:
+        return processed_stem
+    return processed_stem[first_underscore_index + 1:]
+
+
+def build_audio_index(raw_audio_dir, extensions=(".wav", ".mp3")):
+    """
+    Maps raw audio file stems to their paths with a single directory scan.
+
+    Args:
+        raw_audio_dir: Root directory of the raw audio files
+        extensions: Accepted extensions, earlier ones win when a stem has several
+
+    Returns:
+        Dictionary mapping file stems to paths
+    """
+    priority = {ext: i for i, ext in enumerate(extensions)}
+    audio_index = {}
+    for path in Path(raw_audio_dir).rglob("*"):
+        ext = path.suffix.lower()
+        if ext not in priority:
+            continue
+        current = audio_index.get(path.stem)
+        if current is None or priority[ext] < priority[current.suffix.lower()]:
+            audio_index[path.stem] = path
+    return audio_index
+
+
 def visualize_and_listen(
     model,
     data_loader,
@@ -88,6 +120,9 @@ def visualize_and_listen(
     print(f"--- Starting Visualization & Listening ---")
     if not can_find_raw:
         print(f"WARNING: Raw audio directory not found. Cannot play original audio.")
+    else:
+        # Scan the raw audio directory once instead of once per sample
+        audio_index = build_audio_index(raw_audio_dir)
     if not can_synthesize:
         print("WARNING: SoundFont not found. Cannot synthesize predicted MIDI.")
 
@@ -121,10 +156,7 @@ def visualize_and_listen(
                 current_processed_path = Path(processed_file_paths[i])
                 original_stem_with_prefix = current_processed_path.stem
 
-                # Remove drummer prefix to match raw filenames
-                first_underscore_index = original_stem_with_prefix.find('_')
-                file_stem = original_stem_with_prefix[first_underscore_index +
-                                                      1:] if first_underscore_index != -1 else original_stem_with_prefix
+                file_stem = raw_file_stem(original_stem_with_prefix)
 
                 print(
                     f"\n--- Sample {samples_seen + 1}/{num_samples} (Stem: {file_stem}) ---")
@@ -150,7 +182,7 @@ def visualize_and_listen(
                 # Play audio comparison
                 if can_find_raw and can_synthesize:
                     _play_audio_comparison(
-                        file_stem, raw_audio_dir, pred_onset_probs, pred_velocities,
+                        file_stem, audio_index, pred_onset_probs, pred_velocities,
                         threshold, frame_times, index_to_pitch_map, temp_dir_path,
                         soundfont_path, sr
                     )
@@ -162,15 +194,43 @@ def visualize_and_listen(
 
 
 def _plot_comparison(input_spec, gt_onsets, gt_velocities, pred_onset_probs, pred_velocities,
-                     threshold, file_stem, drum_names, hop_length):
-    """Plot spectrogram, ground truth and predictions side by side."""
-    plt.figure(figsize=(15, 8))
+                     threshold, file_stem, drum_names, hop_length,
+                     start_frame=None, end_frame=None, max_frames=MAX_DISPLAY_FRAMES):
+    """
+    Plot spectrogram, ground truth and predictions side by side.
+
+    See _draw_comparison for the arguments.
+    """
+    _draw_comparison(input_spec, gt_onsets, gt_velocities, pred_onset_probs, pred_velocities,
+                     threshold, file_stem, drum_names, hop_length,
+                     start_frame, end_frame, max_frames)
+    plt.show()
+
+
+def _draw_comparison(input_spec, gt_onsets, gt_velocities, pred_onset_probs, pred_velocities,
+                     threshold, file_stem, drum_names, hop_length,
+                     start_frame=None, end_frame=None, max_frames=MAX_DISPLAY_FRAMES):
+    """
+    Draw the comparison figure without showing it, and return the figure.
+
+    Only the [start_frame, end_frame) window is converted and drawn, and it is
+    max-pooled to at most max_frames columns so onsets stay visible on long inputs.
+    """
+    window = slice(start_frame, end_frame)
+    spec, factor = max_pool_frames(input_spec[:, window].numpy(), max_frames)
+    masked_velocity_gt, _ = max_pool_frames(
+        (gt_velocities[:, window] * gt_onsets[:, window]).numpy(), max_frames)
+    binary_onset_pred = (pred_onset_probs[:, window] > threshold).float()
+    masked_velocity_pred, _ = max_pool_frames(
+        (pred_velocities[:, window] * binary_onset_pred).numpy(), max_frames)
+
+    fig = plt.figure(figsize=(15, 8))
     plt.suptitle(
         f"Transcription Comparison for: {file_stem}", fontsize=14, y=0.99)
 
     # Plot input spectrogram
     plt.subplot(3, 1, 1)
-    plt.imshow(input_spec.numpy(), aspect='auto',
+    plt.imshow(spec, aspect='auto',
                origin='lower', cmap='viridis')
     plt.colorbar(label='Normalized Magnitude')
     plt.title('Input Mel Spectrogram')
@@ -179,8 +239,7 @@ def _plot_comparison(input_spec, gt_onsets, gt_velocities, pred_onset_probs, pre
 
     # Ground truth velocities (masked by onsets)
     plt.subplot(3, 1, 2)
-    masked_velocity_gt = gt_velocities * gt_onsets
-    plt.imshow(masked_velocity_gt.numpy(), aspect='auto',
+    plt.imshow(masked_velocity_gt, aspect='auto',
                origin='lower', cmap='Oranges', vmin=0, vmax=1)
     plt.colorbar(label='Velocity (GT, 0-1)')
     plt.title('Ground Truth Onsets & Velocities')  # Updated title
@@ -189,31 +248,30 @@ def _plot_comparison(input_spec, gt_onsets, gt_velocities, pred_onset_probs, pre
     plt.xticks([])
 
     # Plot predictions
-    binary_onset_pred = (pred_onset_probs > threshold).float()
-    masked_velocity_pred = pred_velocities * binary_onset_pred
     plt.subplot(3, 1, 3)
-    plt.imshow(masked_velocity_pred.numpy(), aspect='auto',
+    plt.imshow(masked_velocity_pred, aspect='auto',
                origin='lower', cmap='Blues', vmin=0, vmax=1)
     plt.colorbar(label='Velocity (Pred, 0-1)')
     plt.title(f'Predicted Onsets (Threshold={threshold:.2f}) & Velocities')
     if drum_names:
         plt.yticks(np.arange(len(drum_names)), drum_names)
-    plt.xlabel(f'Time Frames (Hop Length = {hop_length})')
+    if factor > 1:
+        plt.xlabel(
+            f'Time Frames (Hop Length = {hop_length}, max-pooled x{factor})')
+    else:
+        plt.xlabel(f'Time Frames (Hop Length = {hop_length})')
 
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.show()
+    return fig
 
 
-def _play_audio_comparison(file_stem, raw_audio_dir, pred_onset_probs, pred_velocities,
+def _play_audio_comparison(file_stem, audio_index, pred_onset_probs, pred_velocities,
                            threshold, frame_times, index_to_pitch_map, temp_dir_path,
                            soundfont_path, sr):
     """Play original and synthesized audio."""
     try:
         # Find original audio file
-        found_wav = list(Path(raw_audio_dir).rglob(f"**/{file_stem}.wav"))
-        found_mp3 = list(Path(raw_audio_dir).rglob(f"**/{file_stem}.mp3"))
-        original_audio_path = found_wav[0] if found_wav else (
-            found_mp3[0] if found_mp3 else None)
+        original_audio_path = audio_index.get(file_stem)
 
         if original_audio_path:
             print(f"Displaying original audio: {original_audio_path.name}")
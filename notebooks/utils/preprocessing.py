@@ -0,0 +1,303 @@
+"""
+Batch feature extraction for the drum transcription dataset.
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tqdm.notebook import tqdm
+from typing import List, Optional, Tuple
+
+from utils.audio import preprocess_audio, compute_mel_spectrogram, compute_mel_spectrogram_chunked
+from utils.drum_mapping import MAIN_DRUMS
+from utils.midi import extract_drum_events, align_spectrogram_with_midi
+from utils.normalization import RunningMelStats, FEATURE_STATS_FILENAME
+from utils.sampling import build_clip_index
+from utils.memory import (clip_duration, estimate_clip_memory, chunk_seconds_for_budget,
+                          chunked_clip_memory, run_with_memory_budget)
+
+
+def clip_file_paths(row: pd.Series, base_path: Path) -> Tuple[Path, Path]:
+    """
+    Resolves the audio and MIDI paths of a metadata row.
+
+    Paths are built from the split directory and the relative filenames
+    (which include the drummer/session folders), as bare filenames are not
+    unique across drummers.
+
+    Args:
+        row: Row of the metadata DataFrame
+        base_path: Base path to dataset
+
+    Returns:
+        Tuple of (audio_path, midi_path)
+    """
+    split_dir = Path(base_path) / row["split_set"]
+    return split_dir / row["audio_filename"], split_dir / row["midi_filename"]
+
+
+def create_and_save_training_example(
+    audio_path: Path,
+    midi_path: Path,
+    output_dir: Path,
+    target_sr: int,
+    hop_length: int,
+    n_mels: int,
+    fmin: float,
+    fmax: float,
+    file_id: str,
+    main_drums: List[int] = MAIN_DRUMS,
+    chunk_seconds: Optional[float] = None
+) -> Optional[RunningMelStats]:
+    """
+    Creates and saves a training example with features and targets.
+
+    Args:
+        audio_path: Path to the audio file
+        midi_path: Path to the MIDI file
+        output_dir: Directory to save the outputs
+        target_sr: Target sample rate
+        hop_length: Hop length for spectrogram
+        n_mels: Number of mel bands
+        fmin: Lowest frequency
+        fmax: Highest frequency
+        file_id: Identifier for the file
+        main_drums: List of MIDI note numbers for the main drums to track
+        chunk_seconds: If set, decode the audio in chunks of this many seconds
+                       instead of loading the whole file (for very long clips)
+
+    Returns:
+        Per-mel-bin statistics of the saved spectrogram, or None on failure
+    """
+    try:
+        # Make sure output directory exists
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        if chunk_seconds is not None:
+            # Memory-bounded path, never holds the whole waveform
+            mel_spec = compute_mel_spectrogram_chunked(
+                audio_path,
+                target_sr,
+                chunk_seconds,
+                hop_length=hop_length,
+                n_mels=n_mels,
+                fmin=fmin,
+                fmax=fmax
+            )
+            if mel_spec is None:
+                return None
+        else:
+            # Preprocess audio
+            preprocessed_audio = preprocess_audio(audio_path, target_sr)
+            if preprocessed_audio is None:
+                return None
+
+            # Extract mel spectrogram
+            mel_spec = compute_mel_spectrogram(
+                preprocessed_audio,
+                target_sr,
+                hop_length=hop_length,
+                n_mels=n_mels,
+                fmin=fmin,
+                fmax=fmax
+            )
+            del preprocessed_audio
+
+        # Extract MIDI events
+        drum_events = extract_drum_events(midi_path)
+        if not drum_events:
+            return None
+
+        # Align features and targets
+        onset_target, velocity_target = align_spectrogram_with_midi(
+            mel_spec, drum_events, target_sr, hop_length, main_drums
+        )
+
+        # Statistics are accumulated while the features are still in memory
+        stats = RunningMelStats(n_mels).update(mel_spec)
+
+        # Save to NPZ file, with the clip statistics so re-runs can skip the features
+        output_path = output_dir / f"{file_id}.npz"
+        np.savez_compressed(
+            output_path,
+            mel_spec=mel_spec,
+            onset_target=onset_target,
+            velocity_target=velocity_target,
+            audio_path=str(audio_path),
+            midi_path=str(midi_path),
+            stats_count=stats.count,
+            stats_mean=stats.mean,
+            stats_m2=stats.m2
+        )
+        return stats
+
+    except Exception as e:
+        print(f"Error creating training example for {file_id}: {e}")
+        return None
+
+
+def _process_example(task: dict) -> Tuple[str, Optional[RunningMelStats], bool]:
+    """
+    Worker entry point: processes one file, or reads back an existing one.
+
+    Returns:
+        Tuple of (split, stats, created) where created is False for skipped files
+    """
+    output_path = task["output_dir"] / f"{task['file_id']}.npz"
+    if task["skip_existing"] and output_path.exists():
+        # Existing files still contribute to the statistics. Only the small
+        # stats arrays are read; older files without them fall back to mel_spec
+        try:
+            with np.load(output_path) as data:
+                if "stats_count" in data.files:
+                    stats = RunningMelStats.from_arrays(
+                        data["stats_count"], data["stats_mean"], data["stats_m2"])
+                else:
+                    stats = RunningMelStats(
+                        task["n_mels"]).update(data["mel_spec"])
+        except Exception as e:
+            print(f"Error reading {output_path}: {e}")
+            stats = None
+        return task["split"], stats, False
+
+    stats = create_and_save_training_example(
+        task["audio_path"],
+        task["midi_path"],
+        task["output_dir"],
+        task["target_sr"],
+        task["hop_length"],
+        task["n_mels"],
+        task["fmin"],
+        task["fmax"],
+        task["file_id"],
+        task["main_drums"],
+        task["chunk_seconds"]
+    )
+    return task["split"], stats, stats is not None
+
+
+def process_dataset_parallel(
+    df: pd.DataFrame,
+    base_path: Path,
+    output_dir: Path,
+    target_sr: int,
+    hop_length: int,
+    n_mels: int,
+    fmin: float,
+    fmax: float,
+    num_workers: Optional[int] = None,
+    skip_existing: bool = True,
+    stats_splits: Tuple[str, ...] = ("train",),
+    main_drums: List[int] = MAIN_DRUMS,
+    memory_budget: Optional[int] = None
+) -> Tuple[int, RunningMelStats]:
+    """
+    Processes the dataset in worker processes and computes feature statistics.
+
+    Per-mel-bin mean and variance are computed by each worker for the clips it
+    extracts and merged here, so no second pass over the processed files is
+    needed. The statistics (over stats_splits only, to keep the test split
+    out) are saved to output_dir/feature_stats.npz when any clip of those
+    splits was seen, so per-split calls for validation/test leave the train
+    statistics in place. The per-clip statistics index used by the balanced
+    sampler is updated in output_dir/clip_index.csv.
+
+    With a memory_budget, each clip's peak memory is estimated from its
+    duration (metadata 'duration' column, or the file header) and clips are
+    only started while the estimated total stays under the budget; the
+    estimates are recalibrated from the memory each clip actually adds in
+    its worker (see utils.memory.run_with_memory_budget). Clips that exceed
+    the budget on their own are decoded in chunks.
+
+    Args:
+        df: DataFrame containing file metadata
+        base_path: Base path to dataset
+        output_dir: Output directory for processed files
+        target_sr: Target sample rate
+        hop_length: Hop length for spectrogram
+        n_mels: Number of mel bands
+        fmin: Lowest frequency
+        fmax: Highest frequency
+        num_workers: Number of worker processes (defaults to the CPU count)
+        skip_existing: Skip files that already exist (their saved statistics are still read)
+        stats_splits: Splits that contribute to the normalization statistics
+        main_drums: List of MIDI note numbers for the main drums to track
+        memory_budget: Optional memory budget in bytes for all workers together
+
+    Returns:
+        Tuple of (number of newly processed files, merged statistics)
+    """
+    tasks = []
+    estimates = []
+    n_chunked = 0
+    for _, row in df.iterrows():
+        audio_path, midi_path = clip_file_paths(row, base_path)
+        if not audio_path.exists() or not midi_path.exists():
+            continue
+
+        tasks.append({
+            "audio_path": audio_path,
+            "midi_path": midi_path,
+            "output_dir": output_dir / row["split_set"],
+            "split": row["split_set"],
+            "file_id": f"{row['drummer']}_{audio_path.stem}",
+            "target_sr": target_sr,
+            "hop_length": hop_length,
+            "n_mels": n_mels,
+            "fmin": fmin,
+            "fmax": fmax,
+            "main_drums": main_drums,
+            "skip_existing": skip_existing,
+            "chunk_seconds": None,
+        })
+
+        if memory_budget is None:
+            estimates.append(0)
+            continue
+        if skip_existing and (tasks[-1]["output_dir"] / f"{tasks[-1]['file_id']}.npz").exists():
+            # Only the saved statistics are read back, which costs next to nothing
+            estimates.append(0)
+            continue
+        try:
+            duration = clip_duration(audio_path, row.get("duration"))
+        except Exception as e:
+            print(f"Could not read duration of {audio_path}: {e}")
+            duration = None
+        if duration is None:
+            # Unknown size, the scheduler falls back to recent measurements
+            estimates.append(None)
+            continue
+        estimate = estimate_clip_memory(duration, target_sr, hop_length, n_mels)
+        if estimate > memory_budget:
+            # Too large to load at once, go through the chunked path
+            chunk_seconds = chunk_seconds_for_budget(
+                duration, memory_budget, target_sr, hop_length, n_mels)
+            tasks[-1]["chunk_seconds"] = chunk_seconds
+            estimate = chunked_clip_memory(
+                duration, chunk_seconds, target_sr, hop_length, n_mels)
+            n_chunked += 1
+        estimates.append(estimate)
+    print(f"Found audio and MIDI for {len(tasks)} of {len(df)} rows.")
+    if n_chunked:
+        print(f"{n_chunked} clips exceed the memory budget and will be processed in chunks.")
+
+    stats = RunningMelStats(n_mels)
+    success_count = 0
+    max_workers = num_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = run_with_memory_budget(
+            pool, _process_example, tasks, estimates, memory_budget, max_workers)
+        for split, clip_stats, created in tqdm(results, total=len(tasks), desc="Processing files"):
+            success_count += int(created)
+            if clip_stats is not None and split in stats_splits:
+                stats.merge(clip_stats)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if stats.count > 0:
+        stats.save(output_dir / FEATURE_STATS_FILENAME)
+    else:
+        print(f"No clips from {stats_splits} in this call, "
+              f"{FEATURE_STATS_FILENAME} left unchanged.")
+    build_clip_index(df, base_path, main_drums, processed_dir=output_dir)
+    return success_count, stats
@@ -0,0 +1,256 @@
+"""
+Batch audition report for a whole data split.
+"""
+import html
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import librosa
+import matplotlib.pyplot as plt
+import numpy as np
+import torch
+from tqdm.notebook import tqdm
+
+from utils.audio import midi_to_audio
+from utils.prediction import predictions_to_midi, _draw_comparison
+
+
+def _init_report_worker():
+    """Render figures off-screen in worker processes."""
+    plt.switch_backend('Agg')
+
+
+def _find_original_audio(processed_path, raw_audio_dir):
+    """
+    Finds the raw recording of a processed NPZ file.
+
+    Uses the exact audio_path stored in the NPZ. If the dataset was processed
+    on another machine, the trailing drummer/session/file part of that path
+    is looked up under raw_audio_dir instead (bare stems are not unique
+    across drummers, so they are never used to match).
+
+    Returns:
+        Path to the original audio, or None if it cannot be found
+    """
+    with np.load(processed_path) as data:
+        stored_path = Path(str(data["audio_path"]))
+    if stored_path.exists():
+        return stored_path
+    if raw_audio_dir is None:
+        return None
+    # Try the longest relative tail first, down to drummer/session/file
+    for n_parts in range(len(stored_path.parts) - 1, 2, -1):
+        candidate = Path(raw_audio_dir) / Path(*stored_path.parts[-n_parts:])
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _render_report_item(item):
+    """
+    Renders the plot, MIDI and synthesized audio for one sample.
+
+    Runs in a worker process. Media files are written to item['media_dir'],
+    named after the processed file stem (unique per drummer), and the
+    returned dictionary holds their paths relative to the report.
+    """
+    file_stem = item["file_stem"]
+    media_dir = Path(item["media_dir"])
+    result = {"file_stem": file_stem, "plot": None, "original": None,
+              "predicted": None, "midi": None, "n_notes": 0, "error": None}
+    try:
+        # Comparison plot
+        fig = _draw_comparison(
+            item["input_spec"], item["gt_onsets"], item["gt_velocities"],
+            item["pred_onset_probs"], item["pred_velocities"], item["threshold"],
+            file_stem, item["drum_names"], item["hop_length"])
+        plot_path = media_dir / f"{file_stem}.png"
+        fig.savefig(plot_path, dpi=80)
+        plt.close(fig)
+        result["plot"] = plot_path.name
+
+        # Original audio is copied next to the report so it stays self-contained
+        original_audio_path = _find_original_audio(
+            item["processed_path"], item["raw_audio_dir"])
+        if original_audio_path is not None:
+            copy_path = media_dir / \
+                f"{file_stem}_orig{original_audio_path.suffix}"
+            shutil.copyfile(original_audio_path, copy_path)
+            result["original"] = copy_path.name
+
+        # Predicted MIDI, synthesized if a soundfont is available
+        n_frames = item["input_spec"].shape[1]
+        frame_times = librosa.frames_to_time(
+            np.arange(n_frames), sr=item["sr"], hop_length=item["hop_length"])
+        pred_midi = predictions_to_midi(
+            item["pred_onset_probs"], item["pred_velocities"], item["threshold"],
+            frame_times, item["index_to_pitch_map"])
+        result["n_notes"] = sum(len(inst.notes)
+                                for inst in pred_midi.instruments)
+        pred_midi_path = media_dir / f"{file_stem}_pred.mid"
+        pred_midi.write(str(pred_midi_path))
+        result["midi"] = pred_midi_path.name
+
+        if item["soundfont_path"] is not None:
+            pred_wav_path = media_dir / f"{file_stem}_pred.wav"
+            if midi_to_audio(pred_midi_path, item["soundfont_path"], pred_wav_path, sr=item["sr"]):
+                result["predicted"] = pred_wav_path.name
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def _report_entry_html(result, media_subdir):
+    """HTML block for one sample of the report."""
+    def media(name):
+        return html.escape(f"{media_subdir}/{name}")
+
+    parts = [f"<section><h2>{html.escape(result['file_stem'])}</h2>",
+             f"<p>Predicted notes: {result['n_notes']}</p>"]
+    if result["error"]:
+        parts.append(
+            f"<p class='error'>Error: {html.escape(result['error'])}</p>")
+    if result["original"]:
+        parts.append(f"<p><b>Original Audio:</b><br><audio controls preload='none' "
+                     f"src='{media(result['original'])}'></audio></p>")
+    else:
+        parts.append("<p>Original audio not found</p>")
+    if result["predicted"]:
+        parts.append(f"<p><b>Predicted MIDI (Synthesized):</b><br><audio controls preload='none' "
+                     f"src='{media(result['predicted'])}'></audio></p>")
+    else:
+        parts.append("<p>Predicted MIDI could not be synthesized</p>")
+    if result["midi"]:
+        parts.append(
+            f"<p><a href='{media(result['midi'])}'>Predicted MIDI</a></p>")
+    if result["plot"]:
+        parts.append(
+            f"<img loading='lazy' src='{media(result['plot'])}' width='100%'>")
+    parts.append("</section>")
+    return "\n".join(parts)
+
+
+def generate_audition_report(
+    model,
+    data_loader,
+    device,
+    output_dir,
+    threshold=0.5,
+    sr=22050,
+    hop_length=512,
+    soundfont_path=None,
+    raw_audio_dir=None,
+    drum_names=None,
+    index_to_pitch_map=None,
+    num_workers=None,
+    max_samples=None,
+    title="Audition Report"
+):
+    """
+    Writes a static HTML report comparing original and predicted audio for a split.
+
+    Batch version of visualize_and_listen: each original recording is found
+    from the audio path stored in its processed file, inference runs batch by
+    batch on the model's device, and plotting plus FluidSynth synthesis run in
+    a process pool while the next batch is being predicted. The report is written to output_dir/index.html with
+    audio players and plots; media files go to output_dir/media.
+
+    Args:
+        model: Trained model
+        data_loader: DataLoader of the split to report (e.g. the test split)
+        device: Device to run inference on
+        output_dir: Directory to write the report to
+        threshold: Threshold for onset detection
+        sr: Sample rate
+        hop_length: Hop length between frames
+        soundfont_path: Path to soundfont, predicted audio is skipped if None
+        raw_audio_dir: Root directory of the raw audio, used when the audio path
+                       stored in a processed file does not exist on this machine
+        drum_names: Drum names for the plot labels
+        index_to_pitch_map: Map from drum indices to MIDI pitch numbers
+        num_workers: Number of worker processes (defaults to the CPU count)
+        max_samples: Optional maximum number of samples to include
+        title: Title of the HTML page
+
+    Returns:
+        Path to the written index.html
+    """
+    output_dir = Path(output_dir)
+    media_subdir = "media"
+    media_dir = output_dir / media_subdir
+    media_dir.mkdir(parents=True, exist_ok=True)
+
+    if soundfont_path is not None and not Path(soundfont_path).exists():
+        print("WARNING: SoundFont not found. Cannot synthesize predicted MIDI.")
+        soundfont_path = None
+    if raw_audio_dir is not None and not Path(raw_audio_dir).exists():
+        print("WARNING: Raw audio directory not found. Only audio paths stored "
+              "in the processed files will be used.")
+        raw_audio_dir = None
+
+    model.eval()
+    futures = []
+    samples_seen = 0
+    with torch.no_grad(), ProcessPoolExecutor(max_workers=num_workers,
+                                              initializer=_init_report_worker) as pool:
+        for batch in tqdm(data_loader, desc="Predicting"):
+            if max_samples is not None and samples_seen >= max_samples:
+                break
+
+            inputs = batch["input"].to(device)
+            onset_logits, velocity_preds = model(inputs)
+            onset_probs = torch.sigmoid(onset_logits).cpu()
+            velocity_preds = velocity_preds.cpu()
+            inputs = inputs.cpu()
+
+            for i in range(inputs.size(0)):
+                if max_samples is not None and samples_seen >= max_samples:
+                    break
+                processed_path = Path(batch["file_paths"][i])
+                futures.append(pool.submit(_render_report_item, {
+                    "file_stem": processed_path.stem,
+                    "processed_path": str(processed_path),
+                    "raw_audio_dir": str(raw_audio_dir) if raw_audio_dir is not None else None,
+                    "media_dir": str(media_dir),
+                    "input_spec": inputs[i],
+                    "gt_onsets": batch["onset_target"][i],
+                    "gt_velocities": batch["velocity_target"][i],
+                    "pred_onset_probs": onset_probs[i],
+                    "pred_velocities": velocity_preds[i],
+                    "threshold": threshold,
+                    "sr": sr,
+                    "hop_length": hop_length,
+                    "drum_names": drum_names,
+                    "index_to_pitch_map": index_to_pitch_map,
+                    "soundfont_path": str(soundfont_path) if soundfont_path is not None else None,
+                }))
+                samples_seen += 1
+
+        results = [future.result()
+                   for future in tqdm(futures, desc="Rendering")]
+
+    n_errors = sum(1 for r in results if r["error"])
+    body = "\n".join(_report_entry_html(r, media_subdir) for r in results)
+    page = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1200px; margin: auto; }}
+section {{ border-bottom: 1px solid #ccc; padding: 1em 0; }}
+.error {{ color: #c00; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>{len(results)} samples, threshold {threshold:.2f}, {n_errors} errors</p>
+{body}
+</body>
+</html>
+"""
+    report_path = output_dir / "index.html"
+    report_path.write_text(page, encoding="utf-8")
+    print(f"Wrote audition report with {len(results)} samples to {report_path}")
+    return report_path
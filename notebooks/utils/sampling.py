@@ -0,0 +1,257 @@
+"""
+Per-clip statistics index and metadata-aware balanced sampling.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from torch.utils.data import Sampler
+
+from .drum_mapping import MAIN_DRUMS, GM_DRUM_MAPPING
+from .midi import extract_drum_events
+
+# Default location of the index, stored next to the processed features
+CLIP_INDEX_FILENAME = "clip_index.csv"
+
+# Metadata columns copied verbatim into the index
+INDEX_METADATA_COLUMNS = ["drummer", "style", "bpm", "beat_type", "duration",
+                          "kit_name", "split_set"]
+
+
+def onset_count_column(pitch: int) -> str:
+    """Name of the index column holding onset counts for a drum pitch."""
+    return f"n_{GM_DRUM_MAPPING.get(pitch, pitch)}".lower()
+
+
+def count_drum_onsets(midi_path: Path, main_drums: List[int] = MAIN_DRUMS) -> Dict[int, int]:
+    """
+    Counts onsets per tracked drum in a MIDI file.
+
+    Uses the same rule as align_spectrogram_with_midi, so the counts match
+    the hits that end up in onset_target (only the exact pitches in
+    main_drums are counted, other articulations are not folded in).
+
+    Args:
+        midi_path: Path to the MIDI file
+        main_drums: List of MIDI note numbers for the main drums to track
+
+    Returns:
+        Dictionary mapping each pitch in main_drums to its number of onsets
+    """
+    drum_events = extract_drum_events(midi_path)
+    return {pitch: len(drum_events.get(pitch, [])) for pitch in main_drums}
+
+
+def build_clip_index(
+    df: pd.DataFrame,
+    base_path: Path,
+    main_drums: List[int] = MAIN_DRUMS,
+    processed_dir: Optional[Path] = None
+) -> pd.DataFrame:
+    """
+    Builds the per-clip statistics index used by the balanced sampler.
+
+    Only the MIDI files are read, so this is cheap enough to run once at the
+    end of preprocessing (process_dataset_parallel calls it). The file_id
+    column matches the processed NPZ stem.
+
+    If processed_dir is given, the index is saved to
+    processed_dir/clip_index.csv. Rows already in that file are kept unless
+    they are rebuilt here, so the index can be built one split at a time;
+    nothing is written when no clip was found.
+
+    Args:
+        df: DataFrame containing file metadata (subset_metadata.csv)
+        base_path: Base path to dataset (MIDI files are at base_path/split_set/midi_filename)
+        main_drums: List of MIDI note numbers for the main drums to track
+        processed_dir: Optional processed dataset directory to save the index in
+
+    Returns:
+        DataFrame with one row per clip: file_id, metadata columns and
+        per-drum onset counts
+    """
+    rows = []
+    for _, row in df.iterrows():
+        midi_path = Path(base_path) / row["split_set"] / row["midi_filename"]
+        if not midi_path.exists():
+            continue
+
+        entry = {
+            "file_id": f"{row['drummer']}_{Path(row['audio_filename']).stem}"}
+        for column in INDEX_METADATA_COLUMNS:
+            entry[column] = row[column]
+
+        for pitch, count in count_drum_onsets(midi_path, main_drums).items():
+            entry[onset_count_column(pitch)] = count
+        rows.append(entry)
+
+    index = pd.DataFrame(rows)
+    if processed_dir is not None:
+        output_path = Path(processed_dir) / CLIP_INDEX_FILENAME
+        if index.empty:
+            print(f"No clips found, {output_path} left unchanged.")
+            return index
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.exists():
+            existing = load_clip_index(output_path)
+            existing = existing[~existing["file_id"].isin(index["file_id"])]
+            index = pd.concat([existing, index], ignore_index=True)
+        index.to_csv(output_path, index=False)
+        print(f"Saved clip index with {len(index)} clips to {output_path}")
+    return index
+
+
+def load_clip_index(path: Path) -> pd.DataFrame:
+    """Loads a clip index saved by build_clip_index."""
+    return pd.read_csv(path)
+
+
+def select_clips(
+    index: pd.DataFrame,
+    split: Optional[str] = None,
+    kits: Optional[Sequence[str]] = None,
+    kit_contains: Optional[str] = None,
+    styles: Optional[Sequence[str]] = None,
+    drummers: Optional[Sequence[str]] = None,
+    min_bpm: Optional[float] = None,
+    max_bpm: Optional[float] = None,
+    min_duration: Optional[float] = None,
+    max_duration: Optional[float] = None,
+    has_drums: Optional[Sequence[int]] = None
+) -> pd.DataFrame:
+    """
+    Selects a subset of clips from the index, e.g. only 909 kits above 120 bpm:
+
+        select_clips(index, kit_contains="909", min_bpm=120)
+
+    Args:
+        index: Clip index DataFrame
+        split: Keep only this split_set ('train', 'validation', 'test')
+        kits: Keep only these exact kit names
+        kit_contains: Keep kits whose name contains this substring
+        styles: Keep only these styles (a prefix match, so 'rock' keeps 'rock/halftime')
+        drummers: Keep only these drummers
+        min_bpm: Minimum tempo (inclusive)
+        max_bpm: Maximum tempo (inclusive)
+        min_duration: Minimum clip duration in seconds (inclusive)
+        max_duration: Maximum clip duration in seconds (inclusive)
+        has_drums: Keep clips with at least one onset of each of these pitches
+
+    Returns:
+        Filtered DataFrame (rows keep their original index labels)
+    """
+    mask = np.ones(len(index), dtype=bool)
+
+    if split is not None:
+        mask &= (index["split_set"] == split).to_numpy()
+    if kits is not None:
+        mask &= index["kit_name"].isin(kits).to_numpy()
+    if kit_contains is not None:
+        mask &= index["kit_name"].str.contains(
+            kit_contains, regex=False).to_numpy()
+    if styles is not None:
+        style_root = index["style"].str.split("/").str[0]
+        mask &= (index["style"].isin(styles) |
+                 style_root.isin(styles)).to_numpy()
+    if drummers is not None:
+        mask &= index["drummer"].isin(drummers).to_numpy()
+    if min_bpm is not None:
+        mask &= (index["bpm"] >= min_bpm).to_numpy()
+    if max_bpm is not None:
+        mask &= (index["bpm"] <= max_bpm).to_numpy()
+    if min_duration is not None:
+        mask &= (index["duration"] >= min_duration).to_numpy()
+    if max_duration is not None:
+        mask &= (index["duration"] <= max_duration).to_numpy()
+    if has_drums is not None:
+        for pitch in has_drums:
+            mask &= (index[onset_count_column(pitch)] > 0).to_numpy()
+
+    return index[mask]
+
+
+class BalancedClipSampler(Sampler):
+    """
+    Samples dataset indices balanced across drum classes and kits.
+
+    Each draw picks a drum class, then a kit that has clips containing that
+    drum, then a clip from that (drum, kit) bucket. Buckets are precomputed
+    from the clip index, so a draw is O(1) and no features are loaded.
+    Rare classes (Crash, Ride, Tom) are therefore seen as often as Kick and
+    HiHat, which reduces the need for a large positive_weight.
+    """
+
+    def __init__(
+        self,
+        index: pd.DataFrame,
+        file_ids: Sequence[str],
+        num_samples: Optional[int] = None,
+        main_drums: List[int] = MAIN_DRUMS,
+        class_weights: Optional[Dict[int, float]] = None,
+        balance_kits: bool = True,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            index: Clip index DataFrame (possibly filtered with select_clips)
+            file_ids: File id of each dataset item, in dataset order
+                      (e.g. [Path(p).stem for p in dataset.file_paths])
+            num_samples: Number of draws per epoch, defaults to len(file_ids)
+            main_drums: Drum pitches to balance over
+            class_weights: Optional relative draw weight per drum pitch
+                           (uniform if None)
+            balance_kits: Pick kits uniformly; if False, pick clips uniformly
+                          among all clips containing the drum
+            seed: Random seed for reproducible epochs
+        """
+        position = {file_id: i for i, file_id in enumerate(file_ids)}
+        self.num_samples = num_samples if num_samples is not None else len(
+            file_ids)
+        self.balance_kits = balance_kits
+        self.rng = np.random.default_rng(seed)
+
+        # Dataset positions of each clip present in both index and dataset
+        in_dataset = index["file_id"].isin(position)
+        rows = index[in_dataset]
+        positions = rows["file_id"].map(position).to_numpy()
+        kit_codes, kit_names = pd.factorize(rows["kit_name"])
+        self.kit_names = list(kit_names)
+
+        # Per drum: list of per-kit position arrays, and all positions
+        self.drums = []
+        self.kit_buckets = []
+        self.drum_buckets = []
+        for pitch in main_drums:
+            has_drum = (rows[onset_count_column(pitch)] > 0).to_numpy()
+            if not has_drum.any():
+                continue
+            buckets = [positions[has_drum & (kit_codes == k)]
+                       for k in range(len(kit_names))]
+            self.drums.append(pitch)
+            self.kit_buckets.append([b for b in buckets if len(b) > 0])
+            self.drum_buckets.append(positions[has_drum])
+
+        if not self.drums:
+            raise ValueError("No clips in the index match the dataset files.")
+
+        weights = np.array([(class_weights or {}).get(pitch, 1.0)
+                            for pitch in self.drums], dtype=np.float64)
+        self.class_probs = weights / weights.sum()
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        # Draw all random numbers up front, then index the buckets
+        drum_choices = self.rng.choice(
+            len(self.drums), size=self.num_samples, p=self.class_probs)
+        uniforms = self.rng.random((self.num_samples, 2))
+
+        for d, (u_kit, u_clip) in zip(drum_choices, uniforms):
+            if self.balance_kits:
+                kit_buckets = self.kit_buckets[d]
+                bucket = kit_buckets[int(u_kit * len(kit_buckets))]
+            else:
+                bucket = self.drum_buckets[d]
+            yield int(bucket[int(u_clip * len(bucket))])
@@ -0,0 +1,196 @@
+"""
+Memory-bounded batch transcription of audio files to MIDI.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import librosa
+import numpy as np
+import torch
+from tqdm.notebook import tqdm
+
+from utils.audio import preprocess_audio, compute_mel_spectrogram, compute_mel_spectrogram_chunked
+from utils.memory import (clip_duration, estimate_clip_memory, chunk_seconds_for_budget,
+                          chunked_clip_memory, run_with_memory_budget)
+from utils.prediction import predictions_to_midi
+from utils.decimation import decimated_inference
+
+
+def _extract_features(task: dict):
+    """
+    Worker entry point: computes the model input for one audio file.
+
+    Returns:
+        Tuple of (audio_path, log-mel spectrogram or None)
+    """
+    if task["chunk_seconds"] is not None:
+        mel_spec = compute_mel_spectrogram_chunked(
+            task["audio_path"], task["sr"], task["chunk_seconds"],
+            hop_length=task["hop_length"], n_mels=task["n_mels"],
+            fmin=task["fmin"], fmax=task["fmax"], normalizer=task["normalizer"])
+    else:
+        audio = preprocess_audio(task["audio_path"], task["sr"])
+        if audio is None:
+            return task["audio_path"], None
+        mel_spec = compute_mel_spectrogram(
+            audio, task["sr"], hop_length=task["hop_length"], n_mels=task["n_mels"],
+            fmin=task["fmin"], fmax=task["fmax"], normalizer=task["normalizer"])
+    if mel_spec is not None:
+        mel_spec = mel_spec.astype(np.float32)
+    return task["audio_path"], mel_spec
+
+
+def _predict_in_windows(model, spec, device, frames_per_call=None, context_frames=8):
+    """
+    Runs the model over a spectrogram, optionally in overlapping windows.
+
+    Windows overlap by context_frames on each side and only their centre is
+    kept, so activation memory is bounded for very long inputs.
+
+    Returns:
+        Tuple of (onset_probs, velocities) [n_drums, n_frames] on the CPU
+    """
+    n_frames = spec.shape[1]
+    with torch.no_grad():
+        if frames_per_call is None or n_frames <= frames_per_call:
+            onset_logits, velocity_preds = model(spec.unsqueeze(0).to(device))
+            return torch.sigmoid(onset_logits[0]).cpu(), velocity_preds[0].cpu()
+
+        onset_parts, velocity_parts = [], []
+        for start in range(0, n_frames, frames_per_call):
+            end = min(start + frames_per_call, n_frames)
+            lo = max(0, start - context_frames)
+            hi = min(n_frames, end + context_frames)
+            onset_logits, velocity_preds = model(
+                spec[:, lo:hi].unsqueeze(0).to(device))
+            onset_parts.append(torch.sigmoid(
+                onset_logits[0, :, start - lo:end - lo]).cpu())
+            velocity_parts.append(velocity_preds[0, :, start - lo:end - lo].cpu())
+    return torch.cat(onset_parts, dim=1), torch.cat(velocity_parts, dim=1)
+
+
+def transcribe_audio_files(
+    model,
+    audio_paths: List[Path],
+    output_dir: Path,
+    device,
+    index_to_pitch_map: Dict[int, int],
+    threshold: float = 0.5,
+    sr: int = 22050,
+    hop_length: int = 512,
+    n_mels: int = 229,
+    fmin: float = 20.0,
+    fmax: float = 8000.0,
+    normalizer=None,
+    durations: Optional[Dict[str, float]] = None,
+    memory_budget: Optional[int] = None,
+    num_workers: Optional[int] = None,
+    frames_per_call: Optional[int] = None,
+    decimate: bool = False,
+    decimation_kwargs: Optional[Dict] = None
+) -> List[Path]:
+    """
+    Transcribes audio files to MIDI files with a bound on feature extraction memory.
+
+    Features are extracted in worker processes scheduled by the memory
+    budget (see utils.memory.run_with_memory_budget); files too long to load
+    at once are decoded in chunks. Inference runs in this process as the
+    features arrive, optionally in windows of frames_per_call frames. With
+    decimate=True the model only runs on regions with transient energy (see
+    utils.decimation.decimated_inference).
+
+    Args:
+        model: Trained model
+        audio_paths: Audio files to transcribe
+        output_dir: Directory to write the MIDI files to
+        device: Device to run inference on
+        index_to_pitch_map: Map from drum indices to MIDI pitch numbers
+        threshold: Threshold for onset detection
+        sr: Sample rate
+        hop_length: Hop length between frames
+        n_mels: Number of mel bands
+        fmin: Lowest frequency (Hz)
+        fmax: Highest frequency (Hz)
+        normalizer: Optional FeatureNormalizer matching the training features
+        durations: Optional known durations by path (e.g. from the metadata),
+                   otherwise read from the file headers
+        memory_budget: Optional memory budget in bytes for all workers together
+        num_workers: Number of worker processes (defaults to the CPU count)
+        frames_per_call: Optional maximum number of frames per model call
+                         (dense inference only)
+        decimate: Skip frames without transient energy (onset-aware decimation)
+        decimation_kwargs: Optional arguments for decimated_inference
+                           (flux_threshold, context_frames, ...)
+
+    Returns:
+        Paths of the written MIDI files
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    durations = durations or {}
+
+    tasks = []
+    estimates = []
+    for audio_path in audio_paths:
+        task = {"audio_path": Path(audio_path), "sr": sr, "hop_length": hop_length,
+                "n_mels": n_mels, "fmin": fmin, "fmax": fmax,
+                "normalizer": normalizer, "chunk_seconds": None}
+        estimate = 0
+        if memory_budget is not None:
+            try:
+                duration = clip_duration(
+                    audio_path, durations.get(str(audio_path)))
+            except Exception as e:
+                # Unknown size, the scheduler falls back to recent measurements
+                print(f"Could not read duration of {audio_path}: {e}")
+                duration = None
+            if duration is None:
+                estimate = None
+            else:
+                estimate = estimate_clip_memory(
+                    duration, sr, hop_length, n_mels)
+            if estimate is not None and estimate > memory_budget:
+                task["chunk_seconds"] = chunk_seconds_for_budget(
+                    duration, memory_budget, sr, hop_length, n_mels)
+                estimate = chunked_clip_memory(
+                    duration, task["chunk_seconds"], sr, hop_length, n_mels)
+        tasks.append(task)
+        estimates.append(estimate)
+
+    model.eval()
+    written = []
+    frames_total = frames_skipped = 0
+    max_workers = num_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = run_with_memory_budget(
+            pool, _extract_features, tasks, estimates, memory_budget, max_workers)
+        for audio_path, mel_spec in tqdm(results, total=len(tasks), desc="Transcribing"):
+            if mel_spec is None:
+                print(f"Skipping {audio_path}: feature extraction failed")
+                continue
+
+            spec = torch.from_numpy(mel_spec)
+            if decimate:
+                onset_probs, velocities, stats = decimated_inference(
+                    model, spec, device, **(decimation_kwargs or {}))
+                frames_total += stats["frames"]
+                frames_skipped += stats["frames_skipped"]
+            else:
+                onset_probs, velocities = _predict_in_windows(
+                    model, spec, device, frames_per_call)
+            frame_times = librosa.frames_to_time(
+                np.arange(mel_spec.shape[1]), sr=sr, hop_length=hop_length)
+            pm = predictions_to_midi(
+                onset_probs, velocities, threshold, frame_times, index_to_pitch_map)
+
+            midi_path = output_dir / f"{audio_path.stem}.mid"
+            pm.write(str(midi_path))
+            written.append(midi_path)
+
+    print(f"Wrote {len(written)} of {len(tasks)} transcriptions to {output_dir}")
+    if decimate and frames_total:
+        print(f"Decimation skipped {frames_skipped} of {frames_total} frames "
+              f"({frames_skipped / frames_total * 100:.1f}%)")
+    return written
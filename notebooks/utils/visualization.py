@@ -3,110 +3,210 @@ Visualization utilities for drum patterns and audio.
 """
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
 from .drum_mapping import get_roland_to_simplified_category, get_drum_name_simplified
 
+# Define colors for each drum type
+DRUM_COLORS = {
+    36: 'red',      # Kick
+    38: 'blue',     # Snare
+    42: 'green',    # HiHat
+    47: 'purple',   # Tom
+    49: 'orange',   # Crash
+    51: 'yellow',   # Ride
+}
+
+# Simplified drum mapping used for ticks and labels
+SIMPLIFIED_DRUMS = {
+    36: "Kick",
+    38: "Snare",
+    42: "HiHat",
+    47: "Tom",
+    49: "Crash",
+    51: "Ride"
+}
+
+# Default number of columns drawn for long plots (roughly screen resolution)
+MAX_DISPLAY_FRAMES = 2000
+
+
+def max_pool_frames(array, max_frames=MAX_DISPLAY_FRAMES):
+    """
+    Downsamples the last (time) axis to at most max_frames columns by max-pooling.
+
+    Max-pooling keeps single-frame onsets visible, which plain striding or
+    averaging would drop or blur away.
+
+    Args:
+        array: NumPy array [..., n_frames]
+        max_frames: Maximum number of output frames
+
+    Returns:
+        Tuple of (pooled_array, factor) where factor is the number of input
+        frames per output frame (1 if no pooling was needed)
+    """
+    n_frames = array.shape[-1]
+    if max_frames is None or n_frames <= max_frames:
+        return array, 1
+
+    factor = int(np.ceil(n_frames / max_frames))
+    n_out = int(np.ceil(n_frames / factor))
+    pad = n_out * factor - n_frames
+    if pad:
+        # Pad with the edge value so padding never wins the max
+        pad_width = [(0, 0)] * (array.ndim - 1) + [(0, pad)]
+        array = np.pad(array, pad_width, mode='edge')
+    pooled = array.reshape(*array.shape[:-1], n_out, factor).max(axis=-1)
+    return pooled, factor
+
+
+def drum_piano_roll_image(
+    pm,
+    start_pitch=35,
+    end_pitch=52,
+    fs=100,
+    start_time=None,
+    end_time=None,
+):
+    """
+    Bins the simplified drum notes of a PrettyMIDI object into a piano-roll image.
+
+    All notes are handled with vectorized NumPy operations, so this stays
+    fast for multi-minute transcriptions with tens of thousands of notes.
+
+    Args:
+        pm (pretty_midi.PrettyMIDI): The PrettyMIDI object
+        start_pitch (int): The lowest MIDI pitch to include
+        end_pitch (int): The highest MIDI pitch to include
+        fs (int): Sampling frequency for the piano roll grid
+        start_time (float): Start of the time window in seconds (default: 0)
+        end_time (float): End of the time window in seconds (default: end of MIDI)
+
+    Returns:
+        Tuple of (image, pitch_counts, (start_time, end_time)) where image is
+        an int array [n_pitches, n_columns] holding the simplified pitch of
+        each active cell (0 where silent), and pitch_counts maps original
+        pitches to their number of hits in the window
+    """
+    if start_time is None:
+        start_time = 0.0
+    if end_time is None:
+        end_time = pm.get_end_time()
+    n_pitches = end_pitch - start_pitch + 1
+    n_columns = max(1, int(np.ceil((end_time - start_time) * fs)))
+
+    # Find the drum instrument
+    notes = next((instrument.notes for instrument in pm.instruments
+                  if instrument.is_drum), [])
+    if not notes:
+        return np.zeros((n_pitches, n_columns), dtype=np.int16), {}, (start_time, end_time)
+
+    data = np.array([(n.pitch, n.start, n.end) for n in notes])
+    pitches = data[:, 0].astype(np.int64)
+    starts, ends = data[:, 1], data[:, 2]
+
+    # Keep notes inside the pitch range that overlap the time window
+    keep = ((pitches >= start_pitch) & (pitches <= end_pitch) &
+            (ends >= start_time) & (starts <= end_time))
+    pitches, starts, ends = pitches[keep], starts[keep], ends[keep]
+
+    unique_pitches, counts = np.unique(pitches, return_counts=True)
+    pitch_counts = dict(zip(unique_pitches.tolist(), counts.tolist()))
+
+    # Map to simplified pitches with a lookup table instead of per-note calls
+    lookup = np.array([get_roland_to_simplified_category(p)[0]
+                       for p in range(128)])
+    simplified = lookup[pitches]
+    in_range = (simplified >= start_pitch) & (simplified <= end_pitch)
+    simplified, starts, ends = simplified[in_range], starts[in_range], ends[in_range]
+    rows = simplified - start_pitch
+
+    # Difference array: +1 at note start, -1 after note end, then cumsum
+    first = np.clip(((starts - start_time) * fs).astype(np.int64),
+                    0, n_columns - 1)
+    last = np.clip(((ends - start_time) * fs).astype(np.int64),
+                   first, n_columns - 1)
+    diff = np.zeros((n_pitches, n_columns + 1), dtype=np.int32)
+    np.add.at(diff, (rows, first), 1)
+    np.add.at(diff, (rows, last + 1), -1)
+    active = np.cumsum(diff[:, :-1], axis=1) > 0
+
+    image = np.where(active, np.arange(start_pitch, end_pitch + 1)[:, None], 0)
+    return image.astype(np.int16), pitch_counts, (start_time, end_time)
+
 
 def plot_drum_piano_roll(
     pm,
     start_pitch=35,
     end_pitch=52,
     fs=100,
+    start_time=None,
+    end_time=None,
+    max_columns=MAX_DISPLAY_FRAMES,
 ):
     """
     Plots a piano roll representation for simplified drum notes with distinct colors.
 
+    Notes are binned into an image (see drum_piano_roll_image) and drawn with
+    a single imshow call, max-pooled to max_columns so long outputs render quickly.
+
     Args:
         pm (pretty_midi.PrettyMIDI): The PrettyMIDI object
         start_pitch (int): The lowest MIDI pitch to include (default: 35)
         end_pitch (int): The highest MIDI pitch to include (default: 52)
         fs (int): Sampling frequency for the piano roll grid
+        start_time (float): Start of the time window to render in seconds
+        end_time (float): End of the time window to render in seconds
+        max_columns (int): Maximum number of image columns drawn
     """
-    # Define colors for each drum type
-    drum_colors = {
-        36: 'red',      # Kick
-        38: 'blue',     # Snare
-        42: 'green',    # HiHat
-        47: 'purple',   # Tom
-        49: 'orange',   # Crash
-        51: 'yellow',   # Ride
-    }
+    image, pitch_counts, (start_time, end_time) = drum_piano_roll_image(
+        pm, start_pitch, end_pitch, fs, start_time, end_time)
 
-    # Find the drum instrument
-    drum_instrument = None
-    for instrument in pm.instruments:
-        if instrument.is_drum:
-            drum_instrument = instrument
-            break
-
-    if drum_instrument is None or len(drum_instrument.notes) == 0:
+    if not pitch_counts:
         print("No drum track found or the drum track has no notes.")
-        duration = pm.get_end_time()
-        plt.gca().set_xlim([0, duration])
+        plt.gca().set_xlim([start_time, end_time])
         plt.gca().set_ylim([start_pitch, end_pitch])
         plt.title("Drum Piano Roll (No notes found)")
         return
 
     # Print notes found
-    pitch_counts = {}
-    for note in drum_instrument.notes:
-        if start_pitch <= note.pitch <= end_pitch:
-            if note.pitch not in pitch_counts:
-                pitch_counts[note.pitch] = 0
-            pitch_counts[note.pitch] += 1
-
-    if pitch_counts:
-        print("Detected drum hits:")
-        for pitch, count in sorted(pitch_counts.items()):
-            drum_name = get_drum_name_simplified(pitch)
-            print(f"  {drum_name} (pitch {pitch}): {count} hits")
-
-    # Create a clean figure with proper time axis
-    duration = pm.get_end_time()
-    plt.gca().set_xlim([0, duration])
+    print("Detected drum hits:")
+    for pitch, count in sorted(pitch_counts.items()):
+        drum_name = get_drum_name_simplified(pitch)
+        print(f"  {drum_name} (pitch {pitch}): {count} hits")
+
+    # Color index per cell: 0 is transparent, then one entry per drum
+    color_pitches = list(DRUM_COLORS.keys())
+    color_index = np.zeros(128, dtype=np.int16)
+    color_index[color_pitches] = np.arange(1, len(color_pitches) + 1)
+    pooled, _ = max_pool_frames(image, max_columns)
+    colored = np.where(pooled > 0, color_index[pooled], 0)
+    # Active cells with pitches that have no color are drawn gray
+    colored = np.where((pooled > 0) & (colored == 0),
+                       len(color_pitches) + 1, colored)
+    cmap = ListedColormap(['none'] + [DRUM_COLORS[p]
+                          for p in color_pitches] + ['gray'])
+
+    plt.gca().set_xlim([start_time, end_time])
     plt.gca().set_ylim([start_pitch - 0.5, end_pitch + 0.5])
-
-    # Plot each note as a colored line for its duration
-    for note in drum_instrument.notes:
-        if start_pitch <= note.pitch <= end_pitch:
-            # Map to simplified pitch
-            simplified_pitch, _ = get_roland_to_simplified_category(note.pitch)
-
-            # Get color (default to gray for unknown pitches)
-            color = drum_colors.get(simplified_pitch, 'gray')
-
-            # Plot horizontal line for note duration
-            plt.hlines(
-                y=simplified_pitch,
-                xmin=note.start,
-                xmax=note.end,
-                colors=color,
-                linewidth=4
-            )
-
-    # Set ticks and labels for simplified drum mapping
-    simplified_drums = {
-        36: "Kick",
-        38: "Snare",
-        42: "HiHat",
-        47: "Tom",
-        49: "Crash",
-        51: "Ride"
-    }
+    plt.imshow(colored, aspect='auto', origin='lower', cmap=cmap,
+               vmin=0, vmax=len(color_pitches) + 1, interpolation='nearest',
+               extent=[start_time, end_time, start_pitch - 0.5, end_pitch + 0.5])
 
     # Create ticks at these pitches
-    plt.yticks(list(simplified_drums.keys()))
+    plt.yticks(list(SIMPLIFIED_DRUMS.keys()))
 
     # Add drum names as text labels
-    for pitch, name in simplified_drums.items():
+    for pitch, name in SIMPLIFIED_DRUMS.items():
         if start_pitch <= pitch <= end_pitch:
-            plt.text(-0.5, pitch, name, ha="right", va="center")
+            plt.text(start_time - 0.5, pitch, name, ha="right", va="center")
 
     # Create a custom legend
     from matplotlib.lines import Line2D
     legend_elements = [
-        Line2D([0], [0], color=drum_colors[pitch], lw=4, label=name)
-        for pitch, name in simplified_drums.items()
-        if pitch in drum_colors
+        Line2D([0], [0], color=DRUM_COLORS[pitch], lw=4, label=name)
+        for pitch, name in SIMPLIFIED_DRUMS.items()
+        if pitch in DRUM_COLORS
     ]
     plt.legend(handles=legend_elements, loc='upper right')
 